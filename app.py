@@ -1,11 +1,13 @@
 import os
 import uuid
 import json
+import time
 import base64
+import asyncio
 from datetime import datetime
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import sqlite3
@@ -17,6 +19,18 @@ try:
 except ImportError:
     pass
 
+# orjson (serialização JSON rápida); sem ele, cai para o json da stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# zstandard (compressão dos arquivos de retenção); sem ele, usa gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # Supabase
 try:
     from supabase import create_client, Client as SupabaseClient
@@ -28,14 +42,46 @@ except ImportError:
 async def lifespan(app: FastAPI):
     # Pré-carrega o CNAE do IBGE na startup para evitar lentidão na 1ª busca
     await _get_cnae_data()
+    retention_stop = asyncio.Event()
+    retention_task = (
+        asyncio.create_task(_retention_loop(retention_stop)) if RETENTION_DAYS > 0 else None
+    )
     yield
+    if retention_task:
+        # Sinaliza a parada e aguarda o lote em andamento terminar
+        retention_stop.set()
+        await retention_task
+
+def _dumps(obj) -> bytes:
+    """Serializa para JSON compacto em UTF-8 (orjson quando disponível)."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
 
-app = FastAPI(lifespan=lifespan)
+class FastJSONResponse(JSONResponse):
+    """JSONResponse usando _dumps — resposta padrão de toda a API."""
+    def render(self, content) -> bytes:
+        return _dumps(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Configurações
-DATABASE         = "database.sqlite"
+DATABASE         = os.getenv("DATABASE_PATH", "database.sqlite")
 SUPABASE_BUCKET  = "documentos"
 
+# Retenção: submissões mais antigas que RETENTION_DAYS são arquivadas (0 = desativado)
+RETENTION_DAYS           = int(os.getenv("RETENTION_DAYS", "0"))
+# Intervalo mínimo de 15 min: valores <= 0 fariam a rotina rodar em laço contínuo
+RETENTION_INTERVAL_HOURS = max(float(os.getenv("RETENTION_INTERVAL_HOURS", "24")), 0.25)
+RETENTION_BATCH_SIZE     = int(os.getenv("RETENTION_BATCH_SIZE", "100"))
+RETENTION_MAX_ATTEMPTS   = int(os.getenv("RETENTION_MAX_ATTEMPTS", "5"))
+RETENTION_ARCHIVE_DIR    = os.getenv("RETENTION_ARCHIVE_DIR", "archive")
+RETENTION_STORAGE_ACTION = os.getenv("RETENTION_STORAGE_ACTION", "delete")  # delete | move
+RETENTION_STORAGE_PREFIX = os.getenv("RETENTION_STORAGE_PREFIX", "arquivo")
+RETENTION_COMPRESSION    = os.getenv(
+    "RETENTION_COMPRESSION", "zstd" if zstandard else "gzip"
+)
+
 # Supabase client
 _supa_url = os.getenv("SUPABASE_URL", "")
 _supa_key = os.getenv("SUPABASE_SERVICE_KEY", "")
@@ -61,12 +107,17 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 # ── CNAE cache ────────────────────────────────────────────────────────────────
-import unicodedata, httpx
+import unicodedata, httpx, gzip, hashlib
+from itertools import islice
 
 _cnae_cache: list[dict] | None = None
+_cnae_index: dict | None = None
+
+# Formato do índice enviado ao navegador. Incrementar se o layout mudar.
+CNAE_INDEX_FORMAT = 1
 
 async def _get_cnae_data() -> list[dict]:
-    global _cnae_cache
+    global _cnae_cache, _cnae_index
     if _cnae_cache is not None:
         return _cnae_cache
     try:
@@ -79,25 +130,102 @@ async def _get_cnae_data() -> list[dict]:
     except Exception as e:
         print(f"[CNAE] Erro ao carregar: {e}")
         _cnae_cache = []
+    _cnae_index = _build_cnae_index(_cnae_cache) if _cnae_cache else None
+    if _cnae_index:
+        print(f"[CNAE] Índice v{_cnae_index['version']} gerado — "
+              f"{len(_cnae_index['body'])} bytes ({len(_cnae_index['gzip'])} gzip).")
     return _cnae_cache
 
 def _normalize(text: str) -> str:
     return unicodedata.normalize("NFD", text).encode("ascii", "ignore").decode().lower()
 
+def _build_cnae_index(data: list[dict]) -> dict:
+    """Gera o índice compacto de CNAE consumido pela busca no navegador.
+    Formato texto, uma subclasse por linha: código<TAB>descrição<TAB>descrição normalizada.
+    A primeira linha é o cabeçalho: CNAE<TAB>formato<TAB>versão.
+    Também guarda cada subclasse já serializada em JSON para o /api/cnae.
+    """
+    norm  = [_normalize(item["descricao"]) for item in data]
+    lines = "\n".join(
+        f"{item['id']}\t{item['descricao']}\t{n}" for item, n in zip(data, norm)
+    )
+    version = hashlib.sha1(
+        f"{CNAE_INDEX_FORMAT}\n{lines}".encode()
+    ).hexdigest()[:12]
+    body = f"CNAE\t{CNAE_INDEX_FORMAT}\t{version}\n{lines}".encode()
+    return {
+        "version": version,
+        "norm":    norm,
+        "json":    [_dumps({"id": i["id"], "descricao": i["descricao"]}) for i in data],
+        "body":    body,
+        "gzip":    gzip.compress(body, compresslevel=9, mtime=0),
+    }
+
 
 @app.get("/api/cnae")
 async def cnae_search(q: str = ""):
     q = q.strip()
     if len(q) < 2:
-        return JSONResponse([])
+        return Response(b"[]", media_type="application/json")
     data = await _get_cnae_data()
+    if not _cnae_index:
+        return Response(b"[]", media_type="application/json")
     norm_q = _normalize(q)
-    results = [
-        {"id": item["id"], "descricao": item["descricao"]}
-        for item in data
-        if norm_q in _normalize(item["descricao"]) or q in item["id"]
-    ][:15]
-    return JSONResponse(results)
+    # Junta os fragmentos pré-serializados em vez de recodificar dicts
+    hits = islice(
+        (frag for item, n, frag in zip(data, _cnae_index["norm"], _cnae_index["json"])
+         if norm_q in n or q in item["id"]),
+        15,
+    )
+    return Response(b"[" + b",".join(hits) + b"]", media_type="application/json")
+
+
+@app.get("/api/cnae/index", include_in_schema=False)
+async def cnae_index(request: Request, v: str = ""):
+    """Índice completo de CNAE para busca local no navegador (pré-comprimido)."""
+    await _get_cnae_data()
+    if not _cnae_index:
+        raise HTTPException(status_code=503, detail="Índice CNAE indisponível")
+
+    # Cada codificação tem sua própria ETag (são representações diferentes)
+    use_gzip = _accepts_gzip(request.headers.get("accept-encoding", ""))
+    etag     = f'"cnae-{_cnae_index["version"]}{"-gz" if use_gzip else ""}"'
+    headers  = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        # URL versionada (?v=) pode ficar em cache indefinidamente
+        "Cache-Control": (
+            "public, max-age=31536000, immutable"
+            if v == _cnae_index["version"] else "no-cache"
+        ),
+    }
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    body = _cnae_index["body"]
+    if use_gzip:
+        body = _cnae_index["gzip"]
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="text/plain; charset=utf-8", headers=headers)
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Interpreta o Accept-Encoding respeitando q-values (ex.: "gzip;q=0" recusa)."""
+    qvalues: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    return qvalues.get("gzip", qvalues.get("x-gzip", qvalues.get("*", 0.0))) > 0
 
 # ── DB ────────────────────────────────────────────────────────────────────────
 def get_db():
@@ -124,11 +252,353 @@ def init_db():
         FOREIGN KEY(submission_id) REFERENCES wizard_submissions(id)
     )
     """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archived_submissions (
+        id TEXT PRIMARY KEY,
+        segment TEXT NOT NULL,
+        byte_offset INTEGER NOT NULL,
+        byte_length INTEGER NOT NULL,
+        created_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS retention_files (
+        file_id INTEGER PRIMARY KEY,
+        status TEXT NOT NULL,
+        path TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        FOREIGN KEY(file_id) REFERENCES submission_files(id)
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS retention_lock (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        owner TEXT,
+        expires_at TIMESTAMP
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO retention_lock (id) VALUES (1)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_submissions_created_at "
+        "ON wizard_submissions(created_at)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_files_submission_id "
+        "ON submission_files(submission_id)"
+    )
     conn.commit()
     conn.close()
 
 init_db()
 
+# ── RETENÇÃO ──────────────────────────────────────────────────────────────────
+# Submissões antigas saem do SQLite para segmentos NDJSON comprimidos em
+# RETENTION_ARCHIVE_DIR. Cada registro é um frame gzip/zstd independente — o
+# segmento inteiro continua legível com zcat/zstdcat — e archived_submissions
+# guarda o offset de cada um para leitura pontual.
+# O estado de cada objeto do bucket fica em retention_files, então falhas são
+# retentadas por objeto (até RETENTION_MAX_ATTEMPTS) entre execuções.
+_SEGMENT_EXT = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+def _compress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return gzip.compress(raw, compresslevel=9, mtime=0)
+
+def _decompress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(raw)
+    return gzip.decompress(raw)
+
+def _storage_path(file_path: str) -> str:
+    """Converte a URL pública gravada em submission_files no caminho do bucket."""
+    marker = f"/{SUPABASE_BUCKET}/"
+    if file_path.startswith("http") and marker in file_path:
+        return file_path.split(marker, 1)[1]
+    return file_path
+
+def _is_not_found(exc: Exception) -> bool:
+    """Objeto inexistente no bucket: já removido/movido antes ou nunca enviado."""
+    status = getattr(exc, "status", None) or getattr(exc, "status_code", None)
+    text   = str(exc).lower()
+    return str(status) == "404" or "not found" in text or "not_found" in text
+
+def _archive_storage(paths: list[str]) -> dict[str, tuple[str, str | None]]:
+    """Remove (ou move para RETENTION_STORAGE_PREFIX/) os objetos do bucket.
+    Retorna, por caminho, (status, erro). Status: "deleted", "moved",
+    "missing" (não encontrado — tratado como concluído), "skipped" (Supabase
+    não configurado) ou "error".
+    """
+    if not paths:
+        return {}
+    if not supabase:
+        return {path: ("skipped", None) for path in paths}
+    bucket = supabase.storage.from_(SUPABASE_BUCKET)
+
+    def one(path: str, op) -> tuple[str, str | None]:
+        try:
+            op()
+        except Exception as e:
+            return ("missing", None) if _is_not_found(e) else ("error", str(e))
+        return ("moved" if RETENTION_STORAGE_ACTION == "move" else "deleted"), None
+
+    if RETENTION_STORAGE_ACTION == "move":
+        return {
+            path: one(path, lambda p=path: bucket.move(p, f"{RETENTION_STORAGE_PREFIX}/{p}"))
+            for path in paths
+        }
+    try:
+        bucket.remove(paths)
+        return {path: ("deleted", None) for path in paths}
+    except Exception:
+        # Lote falhou: refaz objeto a objeto para isolar os que realmente falham
+        return {path: one(path, lambda p=path: bucket.remove([p])) for path in paths}
+
+def _acquire_retention_lock(conn: sqlite3.Connection, owner: str) -> bool:
+    """Obtém (ou renova) o lease de 1h que impede execuções simultâneas entre processos."""
+    cur = conn.execute(
+        "UPDATE retention_lock SET owner = ?, expires_at = datetime('now', '+1 hour') "
+        "WHERE id = 1 AND (owner IS NULL OR owner = ? OR expires_at < datetime('now'))",
+        (owner, owner)
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+def _release_retention_lock(conn: sqlite3.Connection, owner: str):
+    conn.execute(
+        "UPDATE retention_lock SET owner = NULL, expires_at = NULL WHERE id = 1 AND owner = ?",
+        (owner,)
+    )
+    conn.commit()
+
+def load_archived_submission(submission_id: str) -> dict | None:
+    """Lê uma submissão arquivada a partir do índice (sem descomprimir o segmento todo)."""
+    conn = get_db()
+    try:
+        row = conn.execute(
+            "SELECT segment, byte_offset, byte_length FROM archived_submissions WHERE id = ?",
+            (submission_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    codec = "zstd" if row["segment"].endswith(_SEGMENT_EXT["zstd"]) else "gzip"
+    with open(os.path.join(RETENTION_ARCHIVE_DIR, row["segment"]), "rb") as f:
+        f.seek(row["byte_offset"])
+        return json.loads(_decompress(f.read(row["byte_length"]), codec))
+
+def _submission_files(conn: sqlite3.Connection, ids: list[str]) -> dict[str, list]:
+    marks = ",".join("?" * len(ids))
+    files: dict[str, list] = {}
+    for f in conn.execute(
+        f"SELECT f.id, f.submission_id, f.file_label, f.file_path, "
+        f"r.status, r.path, r.attempts FROM submission_files f "
+        f"LEFT JOIN retention_files r ON r.file_id = f.id "
+        f"WHERE f.submission_id IN ({marks}) ORDER BY f.id", ids
+    ):
+        files.setdefault(f["submission_id"], []).append(f)
+    return files
+
+def _ensure_incremental_vacuum(conn: sqlite3.Connection):
+    """Converte o banco para auto_vacuum incremental (VACUUM completo, uma única vez).
+    Chamado sob o lease da retenção; se o banco estiver ocupado, tenta na próxima execução.
+    """
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("[RETENÇÃO] Convertendo o banco para auto_vacuum incremental (VACUUM)…")
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        print(f"[RETENÇÃO] Não foi possível converter o banco agora: {e}")
+
+def run_retention(days: int | None = None, should_stop=None) -> dict:
+    """Arquiva as submissões com mais de `days` dias (padrão: RETENTION_DAYS) e compacta o banco.
+    Com `days` <= 0 a retenção está desativada e nada é alterado.
+    Por lote: bucket (estado por objeto) → segmento (fsync) → índice + DELETE
+    na mesma transação. Só entram no arquivo submissões cujos objetos foram
+    todos resolvidos; as demais ficam no banco para a próxima execução.
+    `should_stop` é consultado entre lotes para permitir um desligamento limpo.
+    """
+    started = time.monotonic()
+    codec   = RETENTION_COMPRESSION if RETENTION_COMPRESSION in _SEGMENT_EXT else "gzip"
+    if codec == "zstd" and not zstandard:
+        codec = "gzip"
+    stats = {
+        "submissions": 0, "files": 0, "pending": 0,
+        "storage_errors": 0, "storage_gave_up": 0,
+        "archive_bytes": 0, "reclaimed_bytes": 0, "db_bytes": 0,
+        "segment": None, "stopped": False, "locked": False, "disabled": False,
+    }
+    days = RETENTION_DAYS if days is None else days
+    if days <= 0:
+        print("[RETENÇÃO] Desativada (RETENTION_DAYS <= 0) — nada a fazer.")
+        stats["disabled"] = True
+        return stats
+
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    conn  = get_db()
+    seg   = None
+    try:
+        if not _acquire_retention_lock(conn, owner):
+            print("[RETENÇÃO] Outra execução em andamento — ignorando.")
+            stats["locked"] = True
+            return stats
+        _ensure_incremental_vacuum(conn)
+        try:
+            pending: set[str] = set()
+            while True:
+                if should_stop and should_stop():
+                    stats["stopped"] = True
+                    break
+                if not _acquire_retention_lock(conn, owner):
+                    print("[RETENÇÃO] Lease perdido — interrompendo.")
+                    stats["stopped"] = True
+                    break
+                rows = conn.execute(
+                    "SELECT id, data_json, created_at FROM wizard_submissions "
+                    "WHERE created_at < datetime('now', ?) ORDER BY created_at, id LIMIT ?",
+                    (f"-{days} days", RETENTION_BATCH_SIZE + len(pending))
+                ).fetchall()
+                rows = [r for r in rows if r["id"] not in pending]
+                if not rows:
+                    break
+                ids = [r["id"] for r in rows]
+
+                # 1) Bucket: só objetos ainda sem estado ou com erro anterior
+                todo = [
+                    f for fs in _submission_files(conn, ids).values() for f in fs
+                    if f["status"] in (None, "error")
+                ]
+                results = _archive_storage(sorted({_storage_path(f["file_path"]) for f in todo}))
+                for f in todo:
+                    src = _storage_path(f["file_path"])
+                    status, error = results[src]
+                    attempts = f["attempts"] or 0
+                    if status == "error":
+                        attempts += 1
+                        stats["storage_errors"] += 1
+                        if attempts >= RETENTION_MAX_ATTEMPTS:
+                            status = "gave_up"
+                            stats["storage_gave_up"] += 1
+                            print(f"[RETENÇÃO] Desistindo de {src} após {attempts} tentativas: {error}")
+                    path = f"{RETENTION_STORAGE_PREFIX}/{src}" if status == "moved" else f["file_path"]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO retention_files "
+                        "(file_id, status, path, attempts, last_error) VALUES (?, ?, ?, ?, ?)",
+                        (f["id"], status, path, attempts, error)
+                    )
+                conn.commit()
+
+                # 2) Segmento: submissões com todos os objetos resolvidos
+                files = _submission_files(conn, ids)
+                ready = [
+                    r for r in rows
+                    if all(f["status"] != "error" for f in files.get(r["id"], []))
+                ]
+                waiting = {r["id"] for r in rows} - {r["id"] for r in ready}
+                pending.update(waiting)
+                stats["pending"] += len(waiting)
+                if not ready:
+                    continue
+
+                ready_ids = [r["id"] for r in ready]
+                marks     = ",".join("?" * len(ready_ids))
+                archived  = {
+                    a["id"] for a in conn.execute(
+                        f"SELECT id FROM archived_submissions WHERE id IN ({marks})", ready_ids
+                    )
+                }
+                index = []
+                for r in ready:
+                    if r["id"] in archived:
+                        continue
+                    record = {
+                        "id":         r["id"],
+                        "created_at": r["created_at"],
+                        "data":       json.loads(r["data_json"]),
+                        "files": [
+                            {
+                                "label":         f["file_label"],
+                                "path":          f["path"],
+                                "original_path": f["file_path"],
+                                "storage":       f["status"],
+                            }
+                            for f in files.get(r["id"], [])
+                        ],
+                    }
+                    frame = _compress(_dumps(record) + b"\n", codec)
+                    if seg is None:
+                        os.makedirs(RETENTION_ARCHIVE_DIR, exist_ok=True)
+                        stats["segment"] = (
+                            f"segment-{datetime.now():%Y%m%dT%H%M%S}-"
+                            f"{uuid.uuid4().hex[:8]}{_SEGMENT_EXT[codec]}"
+                        )
+                        seg = open(os.path.join(RETENTION_ARCHIVE_DIR, stats["segment"]), "xb")
+                    index.append((r["id"], stats["segment"], seg.tell(), len(frame), r["created_at"]))
+                    seg.write(frame)
+                if index:
+                    seg.flush()
+                    os.fsync(seg.fileno())
+                    stats["archive_bytes"] += sum(i[3] for i in index)
+                    conn.executemany(
+                        "INSERT INTO archived_submissions "
+                        "(id, segment, byte_offset, byte_length, created_at) VALUES (?, ?, ?, ?, ?)",
+                        index
+                    )
+
+                # 3) Remove do SQLite na mesma transação do índice
+                conn.execute(
+                    f"DELETE FROM retention_files WHERE file_id IN "
+                    f"(SELECT id FROM submission_files WHERE submission_id IN ({marks}))", ready_ids
+                )
+                conn.execute(f"DELETE FROM submission_files WHERE submission_id IN ({marks})", ready_ids)
+                conn.execute(f"DELETE FROM wizard_submissions WHERE id IN ({marks})", ready_ids)
+                conn.commit()
+                stats["submissions"] += len(ready_ids)
+                stats["files"]       += sum(len(files.get(i, [])) for i in ready_ids)
+        finally:
+            if seg:
+                seg.close()
+            _release_retention_lock(conn, owner)
+
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        freelist  = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # Via execute() o sqlite3 só avança um passo (libera uma única página)
+        conn.executescript("PRAGMA incremental_vacuum;")
+        stats["reclaimed_bytes"] = (
+            freelist - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        ) * page_size
+        stats["db_bytes"] = os.path.getsize(DATABASE) if os.path.exists(DATABASE) else 0
+    finally:
+        conn.close()
+
+    stats["runtime_s"] = round(time.monotonic() - started, 3)
+    print(
+        f"[RETENÇÃO] {stats['submissions']} submissões / {stats['files']} arquivos arquivados "
+        f"({stats['archive_bytes']} bytes {codec}) — {stats['reclaimed_bytes']} bytes "
+        f"liberados no SQLite ({stats['db_bytes']} bytes restantes) em {stats['runtime_s']}s"
+        + (f" — {stats['pending']} aguardando o bucket" if stats["pending"] else "")
+        + (f" — {stats['storage_errors']} erros no bucket" if stats["storage_errors"] else "")
+        + (f" ({stats['storage_gave_up']} abandonados)" if stats["storage_gave_up"] else "")
+    )
+    return stats
+
+async def _retention_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(run_retention, should_stop=stop.is_set)
+        except Exception as e:
+            import traceback
+            print(f"[RETENÇÃO] ERRO: {e}")
+            traceback.print_exc()
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=RETENTION_INTERVAL_HOURS * 3600)
+        except asyncio.TimeoutError:
+            pass
+
 # ── E-MAIL ────────────────────────────────────────────────────────────────────
 FIELD_LABELS = {
     "razao_social_1":        "Razão Social — Opção 1 (Preferencial)",
@@ -557,7 +1027,10 @@ async def favicon():
 
 @app.get("/", response_class=HTMLResponse)
 async def get_wizard(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse("index.html", {
+        "request": request,
+        "cnae_index_version": _cnae_index["version"] if _cnae_index else "",
+    })
 
 
 @app.post("/submit")
@@ -578,7 +1051,7 @@ async def submit_form(request: Request, background_tasks: BackgroundTasks):
     try:
         cursor.execute(
             "INSERT INTO wizard_submissions (id, data_json) VALUES (?, ?)",
-            (submission_id, json.dumps(plain_data))
+            (submission_id, _dumps(plain_data).decode())
         )
 
         for key in form_data.keys():
@@ -640,7 +1113,7 @@ async def submit_form(request: Request, background_tasks: BackgroundTasks):
             send_confirmation_email, plain_data, file_names, submission_id
         )
 
-        return JSONResponse({"status": "success", "id": submission_id})
+        return FastJSONResponse({"status": "success", "id": submission_id})
 
     except Exception as e:
         conn.rollback()
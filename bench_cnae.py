@@ -0,0 +1,141 @@
+"""Benchmark de serialização JSON das respostas da API.
+
+Compara, por requisição, o custo de:
+  - /api/cnae: dicts + json da stdlib (JSONResponse) × dicts + _dumps × fragmentos pré-serializados
+  - /submit:   json.dumps(plain_data) × _dumps(plain_data)
+
+Por padrão usa um fixture local (sem rede e sem tocar em database.sqlite);
+--ibge carrega as subclasses reais da API do IBGE.
+
+Uso:
+    python bench_cnae.py [repetições] [--ibge]
+"""
+import os
+import sys
+import json
+import asyncio
+import timeit
+import argparse
+from itertools import islice
+
+# Banco em memória: importar app roda init_db(), que não deve criar nem
+# converter (VACUUM) o database.sqlite do diretório atual.
+os.environ["DATABASE_PATH"] = ":memory:"
+import app
+
+# Subclasses reais, replicadas com códigos distintos até o tamanho da tabela do IBGE
+FIXTURE_SUBCLASSES = [
+    ("6201501", "Desenvolvimento de programas de computador sob encomenda"),
+    ("6202300", "Desenvolvimento e licenciamento de programas de computador customizáveis"),
+    ("6204000", "Consultoria em tecnologia da informação"),
+    ("7020400", "Atividades de consultoria em gestão empresarial, exceto consultoria técnica específica"),
+    ("4711301", "Comércio varejista de mercadorias em geral, com predominância de produtos alimentícios - hipermercados"),
+    ("4712100", "Comércio varejista de mercadorias em geral, com predominância de produtos alimentícios - minimercados, mercearias e armazéns"),
+    ("4930202", "Transporte rodoviário de carga, exceto produtos perigosos e mudanças, intermunicipal, interestadual e internacional"),
+    ("5611201", "Restaurantes e similares"),
+    ("1091101", "Fabricação de produtos de panificação industrial"),
+    ("6920601", "Atividades de contabilidade"),
+    ("8599604", "Treinamento em desenvolvimento profissional e gerencial"),
+    ("9602501", "Cabeleireiros, manicure e pedicure"),
+]
+FIXTURE_SIZE = 1331
+
+QUERIES = ["comercio", "software", "consultoria", "transporte", "6201", "alimentos"]
+
+SUBMISSION = {
+    "razao_social_1": "Teste Empresa 1 LTDA",
+    "razao_social_2": "Teste Empresa 2 LTDA",
+    "razao_social_3": "Teste Empresa 3 LTDA",
+    "nome_fantasia": "Tech Test",
+    "cep": "01001-000",
+    "rua": "Praça da Sé",
+    "numero": "123",
+    "bairro": "Sé",
+    "cidade": "São Paulo",
+    "uf": "SP",
+    "inscricao_imobiliaria": "9999.8888.777.6666",
+    "area_m2": "100",
+    "tipo_imovel": "sala",
+    "cnae_codigo": "6201-5/01",
+    "cnae_descricao": "Desenvolvimento de programas de computador sob encomenda",
+    "valor_capital": "10000.00",
+    "tipo_integralizacao": "ato",
+    "meio_integralizacao": "dinheiro",
+    "email": "teste@empresa.com",
+    "telefone": "(11) 99999-9999",
+}
+
+
+def _stdlib_dumps(obj) -> bytes:
+    # Mesmos parâmetros do starlette.responses.JSONResponse.render
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode()
+
+
+def _hit_positions(data: list[dict], q: str) -> list[int]:
+    norm_q = app._normalize(q)
+    return list(islice(
+        (i for i, (item, n) in enumerate(zip(data, app._cnae_index["norm"]))
+         if norm_q in n or q in item["id"]),
+        15,
+    ))
+
+
+def _report(label: str, seconds: float, runs: int):
+    print(f"  {label:<32} {seconds / runs * 1e6:8.2f} µs/req")
+
+
+def _fixture() -> list[dict]:
+    return [
+        {"id": f"{int(cod) + i // len(FIXTURE_SUBCLASSES):07d}", "descricao": desc}
+        for i in range(FIXTURE_SIZE)
+        for cod, desc in [FIXTURE_SUBCLASSES[i % len(FIXTURE_SUBCLASSES)]]
+    ]
+
+
+def main(runs: int, ibge: bool):
+    if ibge:
+        data = asyncio.run(app._get_cnae_data())
+        if not app._cnae_index:
+            sys.exit("Índice CNAE indisponível (falha ao carregar do IBGE).")
+    else:
+        data = _fixture()
+        app._cnae_cache = data
+        app._cnae_index = app._build_cnae_index(data)
+    frags = app._cnae_index["json"]
+    hits  = {q: _hit_positions(data, q) for q in QUERIES}
+
+    print(f"orjson: {'sim' if app.orjson else 'não (fallback stdlib)'}")
+    print(f"CNAE: {len(data)} subclasses ({'IBGE' if ibge else 'fixture'}), "
+          f"{len(QUERIES)} consultas, {runs} repetições\n")
+
+    def dicts_stdlib():
+        for pos in hits.values():
+            _stdlib_dumps([{"id": data[i]["id"], "descricao": data[i]["descricao"]} for i in pos])
+
+    def dicts_fast():
+        for pos in hits.values():
+            app._dumps([{"id": data[i]["id"], "descricao": data[i]["descricao"]} for i in pos])
+
+    def fragments():
+        for pos in hits.values():
+            b"[" + b",".join(frags[i] for i in pos) + b"]"
+
+    n = runs * len(QUERIES)
+    print("/api/cnae — serialização de 15 resultados")
+    _report("dicts + json (stdlib)", timeit.timeit(dicts_stdlib, number=runs), n)
+    _report("dicts + _dumps", timeit.timeit(dicts_fast, number=runs), n)
+    _report("fragmentos pré-serializados", timeit.timeit(fragments, number=runs), n)
+
+    print("\n/submit — data_json da submissão")
+    _report("json.dumps (stdlib)", timeit.timeit(lambda: json.dumps(SUBMISSION), number=runs), runs)
+    _report("_dumps", timeit.timeit(lambda: app._dumps(SUBMISSION).decode(), number=runs), runs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de serialização JSON")
+    parser.add_argument("runs", nargs="?", type=int, default=10_000)
+    parser.add_argument("--ibge", action="store_true",
+                        help="usa as subclasses reais da API do IBGE (requer rede)")
+    args = parser.parse_args()
+    main(args.runs, args.ibge)
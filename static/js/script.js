@@ -140,35 +140,96 @@ document.addEventListener('DOMContentLoaded', () => {
     let cnaeDebounceTimer = null;
     let cnaeAbortController = null;
 
+    // Índice local de CNAE (gerado pelo servidor a partir do cache do IBGE).
+    // Enquanto não estiver disponível, a busca usa /api/cnae.
+    const cnaeIndexVersion = document.getElementById('cnae-container').dataset.indexVersion;
+    let cnaeIndex = null;
+    let cnaeIndexPromise = null;
+
+    const normalizeCnae = (text) =>
+        text.normalize('NFD').replace(/[^\x00-\x7f]/g, '').toLowerCase();
+
+    const loadCnaeIndex = () => {
+        if (cnaeIndexPromise || !cnaeIndexVersion) return cnaeIndexPromise;
+        cnaeIndexPromise = (async () => {
+            try {
+                const res = await fetch(`/api/cnae/index?v=${encodeURIComponent(cnaeIndexVersion)}`);
+                if (!res.ok) return null;
+                const [header, ...lines] = (await res.text()).split('\n');
+                if (!header.startsWith('CNAE\t1\t')) return null;
+                cnaeIndex = lines.map(line => {
+                    const [id, descricao, norm] = line.split('\t');
+                    return { id, descricao, norm };
+                });
+            } catch (err) {
+                console.error('Erro ao carregar índice CNAE', err);
+            }
+            return cnaeIndex;
+        })();
+        return cnaeIndexPromise;
+    };
+
+    const searchCnaeLocal = (query) => {
+        const normQ = normalizeCnae(query);
+        const items = [];
+        for (const item of cnaeIndex) {
+            if (item.norm.includes(normQ) || item.id.includes(query)) {
+                items.push(item);
+                if (items.length === 15) break;
+            }
+        }
+        return items;
+    };
+
+    const renderCnaeResults = (items) => {
+        cnaeResults.innerHTML = '';
+        items.forEach(item => {
+            const div = document.createElement('div');
+            div.textContent = `${item.id} — ${item.descricao}`;
+            div.onclick = () => {
+                document.getElementById('cnae_codigo').value = item.id;
+                document.getElementById('cnae_descricao').value = item.descricao;
+                cnaeSearch.value = `${item.id} — ${item.descricao}`;
+                cnaeResults.innerHTML = '';
+                validateCurrentStep();
+            };
+            cnaeResults.appendChild(div);
+        });
+    };
+
+    cnaeSearch.addEventListener('focus', loadCnaeIndex, { once: true });
+
     cnaeSearch.addEventListener('input', (e) => {
         const query = e.target.value.trim();
         cnaeResults.innerHTML = '';
-        if (query.length < 2) return;
-
         if (cnaeAbortController) cnaeAbortController.abort();
         clearTimeout(cnaeDebounceTimer);
+        if (query.length < 2) return;
+
+        if (cnaeIndex) {
+            renderCnaeResults(searchCnaeLocal(query));
+            return;
+        }
 
         cnaeDebounceTimer = setTimeout(async () => {
+            // Índice ainda carregando: aguarda antes de recorrer ao servidor
+            const indexReady = await loadCnaeIndex();
+            // Vários timers podem ter aguardado o índice; só a consulta atual prossegue
+            if (cnaeSearch.value.trim() !== query) return;
+            if (indexReady) {
+                renderCnaeResults(searchCnaeLocal(query));
+                return;
+            }
+
+            if (cnaeAbortController) cnaeAbortController.abort();
             cnaeAbortController = new AbortController();
             const { signal } = cnaeAbortController;
             try {
                 const res = await fetch(`/api/cnae?q=${encodeURIComponent(query)}`, { signal });
                 if (!res.ok || signal.aborted) return;
                 const items = await res.json();
-
-                cnaeResults.innerHTML = '';
-                items.forEach(item => {
-                    const div = document.createElement('div');
-                    div.textContent = `${item.id} — ${item.descricao}`;
-                    div.onclick = () => {
-                        document.getElementById('cnae_codigo').value = item.id;
-                        document.getElementById('cnae_descricao').value = item.descricao;
-                        cnaeSearch.value = `${item.id} — ${item.descricao}`;
-                        cnaeResults.innerHTML = '';
-                        validateCurrentStep();
-                    };
-                    cnaeResults.appendChild(div);
-                });
+                if (signal.aborted || cnaeSearch.value.trim() !== query) return;
+                renderCnaeResults(items);
             } catch (err) {
                 if (err.name !== 'AbortError') console.error('Erro ao buscar CNAE', err);
             }
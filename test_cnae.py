@@ -0,0 +1,130 @@
+import os
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Banco em memória: importar app roda init_db() (ver test_retention.py)
+os.environ["DATABASE_PATH"] = ":memory:"
+import app
+
+CNAE_FIXTURE = [
+    {"id": "6201501", "descricao": "Desenvolvimento de programas de computador sob encomenda"},
+    {"id": "4711301", "descricao": "Comércio varejista de mercadorias em geral - hipermercados"},
+    {"id": "5611201", "descricao": "Restaurantes e similares"},
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "_cnae_cache", CNAE_FIXTURE)
+    monkeypatch.setattr(app, "_cnae_index", app._build_cnae_index(CNAE_FIXTURE))
+    # Sem o bloco `with`: o lifespan (carga do IBGE e retenção) não é executado
+    return TestClient(app.app)
+
+
+def get_index(client, accept_encoding, **kwargs):
+    headers = {"Accept-Encoding": accept_encoding, **kwargs.pop("headers", {})}
+    return client.get("/api/cnae/index", headers=headers, **kwargs)
+
+
+@pytest.mark.parametrize("accept_encoding, gzip_expected", [
+    ("gzip, deflate", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("*;q=0.5, gzip;q=0", False),
+    ("identity", False),
+])
+def test_index_encoding_follows_q_values(client, accept_encoding, gzip_expected):
+    version = app._cnae_index["version"]
+
+    r = get_index(client, accept_encoding)
+
+    assert r.status_code == 200
+    assert (r.headers.get("content-encoding") == "gzip") is gzip_expected
+    assert r.headers["etag"] == f'"cnae-{version}{"-gz" if gzip_expected else ""}"'
+    assert r.content == app._cnae_index["body"]
+    assert r.text.splitlines()[0] == f"CNAE\t{app.CNAE_INDEX_FORMAT}\t{version}"
+
+
+def test_index_matching_etag_returns_304(client):
+    etag = get_index(client, "gzip").headers["etag"]
+
+    r = get_index(client, "gzip", headers={"If-None-Match": etag})
+
+    assert r.status_code == 304
+    assert r.content == b""
+
+
+def test_index_etag_of_other_encoding_returns_200(client):
+    gzip_etag = get_index(client, "gzip").headers["etag"]
+
+    r = get_index(client, "identity", headers={"If-None-Match": gzip_etag})
+
+    assert r.status_code == 200
+    assert r.headers["etag"] != gzip_etag
+    assert r.content == app._cnae_index["body"]
+
+
+@pytest.mark.parametrize("v, immutable", [("current", True), ("", False), ("old", False)])
+def test_index_cache_control_depends_on_version(client, v, immutable):
+    version = app._cnae_index["version"] if v == "current" else v
+
+    r = get_index(client, "gzip", params={"v": version})
+
+    if immutable:
+        assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+    else:
+        assert r.headers["cache-control"] == "no-cache"
+
+
+def test_index_unavailable_returns_503(client, monkeypatch):
+    monkeypatch.setattr(app, "_cnae_index", None)
+
+    assert get_index(client, "gzip").status_code == 503
+
+
+# 20 subclasses com acentos, aspas e travessão para exercitar a serialização
+SEARCH_FIXTURE = CNAE_FIXTURE + [
+    {"id": f"47{i:05d}", "descricao": f"Comércio varejista de \"artigos\" nº {i} — ótica, calçados e açúcar"}
+    for i in range(20)
+]
+
+
+def legacy_search(data, q):
+    """Implementação original de /api/cnae (dicts + filtro), usada como referência."""
+    norm_q = app._normalize(q)
+    return [
+        {"id": item["id"], "descricao": item["descricao"]}
+        for item in data
+        if norm_q in app._normalize(item["descricao"]) or q in item["id"]
+    ][:15]
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def search_client(request, monkeypatch):
+    if request.param == "orjson" and not app.orjson:
+        pytest.skip("orjson não instalado")
+    if request.param == "stdlib":
+        monkeypatch.setattr(app, "orjson", None)
+    monkeypatch.setattr(app, "_cnae_cache", SEARCH_FIXTURE)
+    monkeypatch.setattr(app, "_cnae_index", app._build_cnae_index(SEARCH_FIXTURE))
+    return TestClient(app.app)
+
+
+@pytest.mark.parametrize("q", ["comercio", "Comércio", "ÓTICA", "acucar", "artigos\"", "6201", "47000", "xyz", "a"])
+def test_search_matches_legacy_dict_results(search_client, q):
+    expected = legacy_search(SEARCH_FIXTURE, q) if len(q) >= 2 else []
+
+    r = search_client.get("/api/cnae", params={"q": q})
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/json"
+    assert json.loads(r.content) == expected
+
+
+def test_search_is_capped_at_15_hits(search_client):
+    r = search_client.get("/api/cnae", params={"q": "varejista"})
+
+    assert len(legacy_search(SEARCH_FIXTURE, "varejista")) == 15
+    assert r.json() == legacy_search(SEARCH_FIXTURE, "varejista")
@@ -0,0 +1,233 @@
+import os
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+
+# Banco em memória só para o import (sobrescreve qualquer DATABASE_PATH do
+# ambiente); cada teste usa seu próprio arquivo em tmp_path
+os.environ["DATABASE_PATH"] = ":memory:"
+import app
+
+
+class StubBucket:
+    """Imita supabase.storage.from_(bucket): objetos em memória e falhas configuráveis."""
+    def __init__(self):
+        self.objects = set()
+        self.fail    = set()
+        self.calls   = []
+
+    def remove(self, paths):
+        self.calls.append(("remove", list(paths)))
+        bad = [p for p in paths if p in self.fail]
+        if bad:
+            raise RuntimeError(f"timeout ao remover {bad[0]}")
+        self.objects.difference_update(paths)
+        return [{"name": p} for p in paths]
+
+    def move(self, src, dst):
+        self.calls.append(("move", src, dst))
+        if src in self.fail:
+            raise RuntimeError("timeout")
+        if src not in self.objects:
+            raise RuntimeError("Object not found")
+        self.objects.remove(src)
+        self.objects.add(dst)
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    stub = StubBucket()
+    monkeypatch.setattr(app, "DATABASE", str(tmp_path / "database.sqlite"))
+    monkeypatch.setattr(app, "RETENTION_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(app, "RETENTION_BATCH_SIZE", 2)
+    monkeypatch.setattr(app, "RETENTION_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(app, "RETENTION_COMPRESSION", "gzip")
+    monkeypatch.setattr(app, "RETENTION_STORAGE_ACTION", "delete")
+    monkeypatch.setattr(
+        app, "supabase", SimpleNamespace(storage=SimpleNamespace(from_=lambda name: stub))
+    )
+    app.init_db()
+    return stub
+
+
+def add_submission(bucket, sid, days_old=400, files=1, uploaded=True):
+    conn = app.get_db()
+    conn.execute(
+        "INSERT INTO wizard_submissions (id, data_json, created_at) "
+        "VALUES (?, ?, datetime('now', ?))",
+        (sid, json.dumps({"razao_social_1": f"Empresa {sid}"}), f"-{days_old} days")
+    )
+    for i in range(files):
+        path = f"{sid}/doc{i}.pdf"
+        if uploaded:
+            bucket.objects.add(path)
+        conn.execute(
+            "INSERT INTO submission_files (submission_id, file_label, file_path) VALUES (?, ?, ?)",
+            (sid, f"doc{i}.pdf",
+             f"https://x.supabase.co/storage/v1/object/public/{app.SUPABASE_BUCKET}/{path}")
+        )
+    conn.commit()
+    conn.close()
+
+
+def ids_in(table, column="id"):
+    conn = app.get_db()
+    try:
+        return {r[0] for r in conn.execute(f"SELECT {column} FROM {table}")}
+    finally:
+        conn.close()
+
+
+def archived_frames():
+    """IDs de todos os registros gravados em todos os segmentos (inclui duplicatas)."""
+    frames = []
+    if not os.path.isdir(app.RETENTION_ARCHIVE_DIR):
+        return frames
+    for name in sorted(os.listdir(app.RETENTION_ARCHIVE_DIR)):
+        with open(os.path.join(app.RETENTION_ARCHIVE_DIR, name), "rb") as f:
+            frames += [json.loads(line)["id"] for line in gzip.decompress(f.read()).splitlines()]
+    return frames
+
+
+def test_archives_indexes_and_deletes_old_submissions(bucket):
+    add_submission(bucket, "s1", files=2)
+    add_submission(bucket, "s2")
+    add_submission(bucket, "s3", days_old=10)
+
+    stats = app.run_retention(365)
+
+    assert (stats["submissions"], stats["files"], stats["pending"]) == (2, 3, 0)
+    assert ids_in("wizard_submissions") == {"s3"}
+    assert ids_in("submission_files", "submission_id") == {"s3"}
+    assert ids_in("archived_submissions") == {"s1", "s2"}
+    assert ids_in("retention_files", "file_id") == set()
+    assert bucket.objects == {"s3/doc0.pdf"}
+    assert sorted(archived_frames()) == ["s1", "s2"]
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_load_archived_submission_round_trip(bucket, monkeypatch, codec):
+    if codec == "zstd" and not app.zstandard:
+        pytest.skip("zstandard não instalado")
+    monkeypatch.setattr(app, "RETENTION_COMPRESSION", codec)
+    add_submission(bucket, "s1")
+    add_submission(bucket, "s2")
+
+    stats = app.run_retention(365)
+
+    assert stats["segment"].endswith(app._SEGMENT_EXT[codec])
+    record = app.load_archived_submission("s2")
+    assert record["id"] == "s2"
+    assert record["data"] == {"razao_social_1": "Empresa s2"}
+    assert record["files"][0]["label"] == "doc0.pdf"
+    assert record["files"][0]["storage"] == "deleted"
+    assert app.load_archived_submission("inexistente") is None
+
+
+def test_storage_failure_is_retried_per_object(bucket):
+    add_submission(bucket, "s1", files=2)
+    add_submission(bucket, "s2")
+    bucket.fail = {"s1/doc0.pdf"}
+
+    stats = app.run_retention(365)
+
+    assert (stats["submissions"], stats["pending"], stats["storage_errors"]) == (1, 1, 1)
+    assert ids_in("wizard_submissions") == {"s1"}
+    assert ids_in("archived_submissions") == {"s2"}
+    assert "s1/doc1.pdf" not in bucket.objects  # objeto que deu certo não é refeito
+
+    bucket.fail = set()
+    bucket.calls.clear()
+    stats = app.run_retention(365)
+
+    assert (stats["submissions"], stats["pending"]) == (1, 0)
+    assert bucket.calls == [("remove", ["s1/doc0.pdf"])]
+    assert ids_in("wizard_submissions") == set()
+    assert sorted(archived_frames()) == ["s1", "s2"]
+
+
+def test_move_treats_missing_objects_as_done_and_records_destination(bucket, monkeypatch):
+    monkeypatch.setattr(app, "RETENTION_STORAGE_ACTION", "move")
+    add_submission(bucket, "s1")
+    add_submission(bucket, "s2", uploaded=False)  # upload falhou na submissão
+
+    stats = app.run_retention(365)
+
+    assert (stats["submissions"], stats["pending"], stats["storage_errors"]) == (2, 0, 0)
+    moved = app.load_archived_submission("s1")["files"][0]
+    assert moved["storage"] == "moved"
+    assert moved["path"] == f"{app.RETENTION_STORAGE_PREFIX}/s1/doc0.pdf"
+    assert moved["path"] in bucket.objects
+    missing = app.load_archived_submission("s2")["files"][0]
+    assert missing["storage"] == "missing"
+    assert missing["path"] == missing["original_path"]
+
+
+def test_gives_up_after_max_attempts_without_duplicate_frames(bucket, monkeypatch):
+    monkeypatch.setattr(app, "RETENTION_STORAGE_ACTION", "move")
+    add_submission(bucket, "s1")
+    bucket.fail = {"s1/doc0.pdf"}
+
+    for _ in range(app.RETENTION_MAX_ATTEMPTS - 1):
+        stats = app.run_retention(365)
+        assert (stats["submissions"], stats["pending"], stats["segment"]) == (0, 1, None)
+    stats = app.run_retention(365)
+
+    assert (stats["submissions"], stats["storage_gave_up"]) == (1, 1)
+    assert app.load_archived_submission("s1")["files"][0]["storage"] == "gave_up"
+    assert archived_frames() == ["s1"]
+
+
+def test_already_indexed_submission_is_not_rewritten(bucket):
+    add_submission(bucket, "s1")
+    app.run_retention(365)
+    # Linha sobrevivente (ex.: cópia restaurada) de um ID já indexado
+    add_submission(bucket, "s1")
+
+    stats = app.run_retention(365)
+
+    assert (stats["submissions"], stats["segment"]) == (1, None)
+    assert ids_in("wizard_submissions") == set()
+    assert archived_frames() == ["s1"]
+
+
+def test_stop_flag_and_lock_prevent_processing(bucket):
+    add_submission(bucket, "s1")
+
+    assert app.run_retention(365, should_stop=lambda: True)["stopped"]
+
+    conn = app.get_db()
+    assert app._acquire_retention_lock(conn, "outro-processo")
+    assert app.run_retention(365)["locked"]
+    app._release_retention_lock(conn, "outro-processo")
+    conn.close()
+
+    assert ids_in("wizard_submissions") == {"s1"}
+    assert app.run_retention(365)["submissions"] == 1
+
+
+def test_disabled_retention_leaves_recent_submissions(bucket, monkeypatch):
+    monkeypatch.setattr(app, "RETENTION_DAYS", 0)
+    add_submission(bucket, "s1", days_old=0)
+
+    assert app.run_retention(0)["disabled"]
+    assert app.run_retention()["disabled"]
+    assert ids_in("wizard_submissions") == {"s1"}
+    assert bucket.objects == {"s1/doc0.pdf"}
+    assert bucket.calls == []
+
+
+def test_first_run_converts_database_to_incremental_vacuum(bucket):
+    conn = app.get_db()
+    conn.execute("PRAGMA auto_vacuum = NONE")
+    conn.execute("VACUUM")
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    conn.close()
+
+    app.run_retention(365)
+
+    conn = app.get_db()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()